@@ -6,29 +6,73 @@ Supports PDF, DOCX, TXT and JSON files. Runs fully offline after installation.
 
 from __future__ import annotations
 
+import codecs
+import hashlib
+import io
 import json
 import os
 import subprocess
 import tempfile
+import threading
 import traceback
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict, deque
+from typing import Iterable, Iterator, Optional
 import atexit
 import shutil
 
 import ollama
 import pandas as pd
-import PyPDF2
 import streamlit as st
-from docx import Document
+
+# PyPDF2, pypdfium2, python-docx and tiktoken are imported where they are
+# used, so the first page render does not pay for loading them.
 
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
 
-# Use a temporary directory for datasets
-TEMP_DIR = tempfile.mkdtemp(prefix="anydocument_")
-DATASET_FILE = os.path.join(TEMP_DIR, "dataset.csv")
-MAX_CONTEXT_CHARS = 8_000
+# Where tiktoken looks for its encoding file (downloaded by setup.sh). Set
+# here rather than only in run.sh so a plain `streamlit run app.py` also
+# finds it instead of trying to download it.
+os.environ.setdefault(
+    "TIKTOKEN_CACHE_DIR",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), ".tiktoken_cache"
+    ),
+)
+
+# Context window requested from Ollama (lowered to the model's own limit if
+# smaller). The document context is budgeted to leave room for the system
+# prompt, question and reply. If the prompt overflows anyway, Ollama drops
+# whole older messages, i.e. the document context, so the budget errs on the
+# small side.
+OLLAMA_NUM_CTX = 8_192
+# Tokens kept free for the model's reply
+REPLY_RESERVE_TOKENS = 1_024
+# Tokens kept free for the system prompt, framing text and the question
+PROMPT_OVERHEAD_TOKENS = 512
+MAX_CONTEXT_TOKENS = (
+    OLLAMA_NUM_CTX - REPLY_RESERVE_TOKENS - PROMPT_OVERHEAD_TOKENS
+)
+# Fraction of the token budget actually used, leaving a margin because
+# tiktoken's cl100k_base counts differ from the model's own tokenizer
+TOKENIZER_SAFETY_FACTOR = 0.75
+# Characters per token assumed when tiktoken is unavailable. Deliberately
+# low: code, numbers, JSON and CJK text often use 1-3 characters per token.
+CHARS_PER_TOKEN = 2
+# Per-file extraction ceiling: a generous upper bound on how many characters
+# MAX_CONTEXT_TOKENS tokens can cover, so extraction never cuts off text the
+# token budget could still use.
+MAX_CONTEXT_CHARS = MAX_CONTEXT_TOKENS * 6
+# Keep the model (and its KV cache) loaded between questions.
+OLLAMA_KEEP_ALIVE = "30m"
+# Number of answers kept in the exact-match answer cache
+ANSWER_CACHE_SIZE = 256
+# Number of question/answer pairs kept in the conversation history
+MAX_CHAT_HISTORY = 100
+# Upper bound on concurrent extraction threads for "Process and Save"
+MAX_EXTRACT_WORKERS = 8
 SYSTEM_PROMPT = (
     "You are an expert Document Analysis Assistant. "
     "You have been given the content of one or more documents. "
@@ -36,22 +80,6 @@ SYSTEM_PROMPT = (
     "If the answer cannot be found in the documents, say so clearly."
 )
 
-# ---------------------------------------------------------------------------
-# Cleanup function for temporary directory
-# ---------------------------------------------------------------------------
-
-def cleanup_temp_dir():
-    """Delete the temporary directory when the application exits."""
-    if os.path.exists(TEMP_DIR):
-        try:
-            shutil.rmtree(TEMP_DIR)
-            print(f"Cleaned up temporary directory: {TEMP_DIR}")
-        except Exception as e:
-            print(f"Error cleaning up temporary directory: {e}")
-
-# Register cleanup function to run on exit
-atexit.register(cleanup_temp_dir)
-
 # ---------------------------------------------------------------------------
 # Page configuration (must be the very first Streamlit call)
 # ---------------------------------------------------------------------------
@@ -67,11 +95,16 @@ st.set_page_config(
 # Load external CSS
 # ---------------------------------------------------------------------------
 
+@st.cache_data
+def _read_css() -> str:
+    """Read the stylesheet once per process; it does not change at runtime."""
+    with open("style.css", "r") as f:
+        return f.read()
+
+
 def load_css():
     """Load external CSS file."""
-    with open("style.css", "r") as f:
-        css = f.read()
-        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
+    st.markdown(f"<style>{_read_css()}</style>", unsafe_allow_html=True)
 
 load_css()
 
@@ -79,15 +112,16 @@ load_css()
 # Initialisation
 # ---------------------------------------------------------------------------
 
-# Ensure temporary directory exists
-os.makedirs(TEMP_DIR, exist_ok=True)
-
 
 def _init_session_state() -> None:
     """Initialise all required session-state keys with safe defaults."""
     defaults: dict = {
         "df": pd.DataFrame(),
-        "chat": [],
+        "contexts": {},
+        "total_chars": 0,
+        "dataset_csv": None,
+        "chat": deque(maxlen=MAX_CHAT_HISTORY),
+        "answer_cache": {"hits": 0, "misses": 0, "last": None},
         "show_data": False,
     }
     for key, value in defaults.items():
@@ -102,9 +136,24 @@ _init_session_state()
 # ---------------------------------------------------------------------------
 
 
+@st.cache_resource
+def _ollama_client() -> ollama.Client:
+    """Return a process-wide Ollama client.
+
+    Reusing one client keeps its HTTP connection pool alive across
+    questions and reruns. The host is taken from ``OLLAMA_HOST`` when set.
+    """
+    return ollama.Client()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
 def get_model_list() -> list[str]:
     """Return the list of locally available Ollama models.
 
+    The result is cached for a minute so that reruns do not spawn the
+    ``ollama`` CLI on every interaction; use ``get_model_list.clear()`` to
+    force a refresh.
+
     Returns an empty list and surfaces an error if the ``ollama`` CLI is
     unavailable or returns an unexpected format.
     """
@@ -119,9 +168,9 @@ def get_model_list() -> list[str]:
         lines = result.stdout.splitlines()
         # Skip the header line ("NAME   ID   SIZE   MODIFIED")
         models = [
-            line.split()[0]
+            line.split(None, 1)[0]
             for line in lines[1:]
-            if line.strip() and not line.startswith("NAME")
+            if line and not line.startswith("NAME")
         ]
         return models
     except FileNotFoundError:
@@ -136,9 +185,86 @@ def get_model_list() -> list[str]:
     return []
 
 
-def extract_text_from_file(uploaded_file) -> Optional[str]:
+def _join_capped(
+    parts: Iterable[str], sep: str = "\n", limit: int = MAX_CONTEXT_CHARS
+) -> str:
+    """Join ``parts`` lazily into at most ``limit`` characters.
+
+    Parts are consumed only until ``limit`` characters are collected, and the
+    result is cut to exactly ``limit``. No single document can contribute
+    more than ``MAX_CONTEXT_CHARS`` to the model context, so extracting
+    beyond that is wasted work.
+    """
+    collected: list[str] = []
+    total = 0
+    for part in parts:
+        collected.append(part)
+        total += len(part) + len(sep)
+        if total >= limit:
+            break
+    return sep.join(collected)[:limit]
+
+
+@st.cache_resource
+def _pdfium_lock() -> threading.Lock:
+    """Return a process-wide lock serialising PDFium calls.
+
+    PDFium is not thread-safe, and extraction runs in worker threads across
+    all sessions, so every pdfium call must hold this lock. PDF extraction
+    is therefore serialised process-wide: concurrent uploads, including
+    those from other sessions, wait for each other.
+    """
+    return threading.Lock()
+
+
+# st.cache_resource functions need the script-run context, which extraction
+# worker threads lack. The lock and the extraction cache directory
+# (EXTRACT_CACHE_DIR, below) are therefore resolved into module globals on
+# the main script thread, and workers only read those globals.
+_PDFIUM_LOCK = _pdfium_lock()
+
+
+def _extract_pdf_text(uploaded_file) -> str:
+    """Extract text from a PDF, page by page, up to ``MAX_CONTEXT_CHARS``.
+
+    Uses PDFium (``pypdfium2``), which is much faster than the pure-Python
+    ``PyPDF2`` parser. Falls back to ``PyPDF2`` if PDFium cannot handle the
+    file. The PDFium part runs under :func:`_pdfium_lock`, so only one PDF
+    is parsed at a time.
+    """
+    data = uploaded_file.getvalue()
+    try:
+        import pypdfium2 as pdfium
+
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(data)
+            try:
+                return _join_capped(
+                    page.get_textpage().get_text_range() for page in pdf
+                )
+            finally:
+                pdf.close()
+    except Exception:  # noqa: BLE001
+        traceback.print_exc()
+        import PyPDF2
+
+        reader = PyPDF2.PdfReader(io.BytesIO(data))
+        return _join_capped(page.extract_text() or "" for page in reader.pages)
+
+
+class UnsupportedFileTypeError(ValueError):
+    """Raised when an uploaded file has an extension we cannot extract."""
+
+
+def extract_text_from_file(uploaded_file) -> str:
     """Extract plain text from an uploaded Streamlit file object.
 
+    The result is capped at ``MAX_CONTEXT_CHARS`` characters and extraction
+    stops once that many are collected, since anything further would be
+    truncated from the context.
+    This function makes no Streamlit calls so it can safely run in a worker
+    thread; failures are raised and reported by the caller.
+
     Parameters
     ----------
     uploaded_file:
@@ -146,56 +272,244 @@ def extract_text_from_file(uploaded_file) -> Optional[str]:
 
     Returns
     -------
-    str | None
-        The extracted text, or ``None`` if extraction failed.
+    str
+        The extracted text.
+
+    Raises
+    ------
+    UnsupportedFileTypeError
+        If the file type is not supported.
     """
     filename: str = uploaded_file.name
     extension: str = os.path.splitext(filename)[1].lower()
 
-    try:
-        if extension == ".pdf":
-            reader = PyPDF2.PdfReader(uploaded_file)
-            return "".join(
-                page.extract_text() or "" for page in reader.pages
-            )
+    if extension == ".pdf":
+        return _extract_pdf_text(uploaded_file)
+
+    if extension == ".docx":
+        from docx import Document
+
+        doc = Document(uploaded_file)
+        return _join_capped(paragraph.text for paragraph in doc.paragraphs)
+
+    if extension == ".txt":
+        # Decode only the bytes that can contribute to the kept prefix (a
+        # UTF-8 character is at most 4 bytes). The incremental decoder drops
+        # a character cut at the slice boundary but still rejects invalid
+        # UTF-8 elsewhere.
+        raw = memoryview(uploaded_file.getvalue())
+        limit = MAX_CONTEXT_CHARS * 4
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        text = decoder.decode(raw[:limit], final=len(raw) <= limit)
+        return text[:MAX_CONTEXT_CHARS]
+
+    if extension == ".json":
+        payload = json.load(uploaded_file)
+        encoder = json.JSONEncoder(indent=2, ensure_ascii=False)
+        return _join_capped(encoder.iterencode(payload), sep="")
+
+    raise UnsupportedFileTypeError(
+        f"Unsupported file type '{extension}' for '{filename}'. Skipping."
+    )
+
 
-        if extension == ".docx":
-            doc = Document(uploaded_file)
-            return "\n".join(paragraph.text for paragraph in doc.paragraphs)
+@st.cache_resource
+def _extract_cache_dir() -> str:
+    """Return the on-disk extraction cache directory for this process.
 
-        if extension == ".txt":
-            return uploaded_file.read().decode("utf-8")
+    Created once per process (Streamlit re-executes the script on every
+    rerun) and removed when the application exits.
+    """
+    path = tempfile.mkdtemp(prefix="anydocument_extract_cache_")
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    return path
 
-        if extension == ".json":
-            payload = json.load(uploaded_file)
-            return json.dumps(payload, indent=2, ensure_ascii=False)
 
-        st.warning(
-            f"Unsupported file type '{extension}' for '{filename}'. Skipping."
-        )
-        return None
+EXTRACT_CACHE_DIR = _extract_cache_dir()
 
-    except Exception as exc:  # noqa: BLE001
-        st.error(f"Could not process '{filename}': {exc}")
+
+def extract_text_cached(uploaded_file) -> str:
+    """Like :func:`extract_text_from_file`, backed by an on-disk cache.
+
+    Entries are keyed by the SHA-256 of the file bytes, its extension and
+    ``MAX_CONTEXT_CHARS``, so re-processing an unchanged file is a plain
+    file read. Safe to call from worker threads.
+    """
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    digest = hashlib.sha256(uploaded_file.getvalue())
+    digest.update(f"{extension}:{MAX_CONTEXT_CHARS}".encode("utf-8"))
+    cache_path = os.path.join(EXTRACT_CACHE_DIR, f"{digest.hexdigest()}.txt")
+
+    if os.path.exists(cache_path):
+        with open(
+            cache_path, "r", encoding="utf-8", errors="surrogatepass"
+        ) as f:
+            return f.read()
+
+    text = extract_text_from_file(uploaded_file)
+    # Write atomically so concurrent uploads of the same file never observe
+    # a partially written entry.
+    tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", errors="surrogatepass") as f:
+        f.write(text)
+    os.replace(tmp_path, cache_path)
+    return text
+
+
+def dataset_csv(dataframe: pd.DataFrame) -> bytes:
+    """Serialise the processed dataset to CSV for download.
+
+    Only called when the user asks for a download; the bytes are kept in
+    session state until the files are processed again.
+    """
+    return dataframe.to_csv(index=False).encode("utf-8")
+
+
+@st.cache_resource
+def _token_encoder():
+    """Return the ``cl100k_base`` tiktoken encoding, or ``None``.
+
+    ``None`` is returned when tiktoken is not installed or its encoding file
+    has not been cached by ``setup.sh``; tiktoken would otherwise try to
+    download it, which breaks offline use and can hang without a timeout.
+    """
+    cache_dir = os.environ["TIKTOKEN_CACHE_DIR"]
+    if not os.path.isdir(cache_dir) or not os.listdir(cache_dir):
+        return None
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # noqa: BLE001
+        traceback.print_exc()
         return None
 
 
-def build_context(dataframe: pd.DataFrame) -> str:
+@st.cache_data(show_spinner=False)
+def _model_context_length(model: str) -> int:
+    """Return the trained context length reported by ``ollama show``.
+
+    Raises if Ollama cannot be queried so that failures are not cached.
+    """
+    info = _ollama_client().show(model).modelinfo or {}
+    for key, value in info.items():
+        if key.endswith(".context_length"):
+            return int(value)
+    return OLLAMA_NUM_CTX
+
+
+def num_ctx_for_model(model: str) -> int:
+    """Return the context window to request from Ollama for ``model``."""
+    try:
+        return min(OLLAMA_NUM_CTX, _model_context_length(model))
+    except Exception:  # noqa: BLE001
+        traceback.print_exc()
+        return OLLAMA_NUM_CTX
+
+
+def build_context(
+    dataframe: pd.DataFrame, max_tokens: int = MAX_CONTEXT_TOKENS
+) -> str:
     """Concatenate document contents into a single context string.
 
-    The result is capped at ``MAX_CONTEXT_CHARS`` to stay within typical
-    model context windows.
+    The result is capped at ``max_tokens * TOKENIZER_SAFETY_FACTOR`` tokens,
+    counted with tiktoken's ``cl100k_base`` encoding when available and
+    otherwise estimated at ``CHARS_PER_TOKEN`` characters per token. Both
+    are approximations of the model's tokenizer. Line endings are normalised
+    and trailing whitespace stripped so that the prompt prefix sent to
+    Ollama is byte-identical across questions.
     """
     combined = "\n\n---\n\n".join(dataframe["content"].astype(str))
-    if len(combined) > MAX_CONTEXT_CHARS:
+    combined = "\n".join(
+        line.rstrip() for line in combined.replace("\r\n", "\n").splitlines()
+    ).rstrip()
+
+    max_tokens = int(max_tokens * TOKENIZER_SAFETY_FACTOR)
+    encoder = _token_encoder()
+    if encoder is None:
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        if len(combined) > max_chars:
+            combined = combined[:max_chars] + "\n\n[... content truncated ...]"
+        return combined
+
+    tokens = encoder.encode(combined, disallowed_special=())
+    if len(tokens) > max_tokens:
         combined = (
-            combined[:MAX_CONTEXT_CHARS] + "\n\n[... content truncated ...]"
+            encoder.decode(tokens[:max_tokens])
+            + "\n\n[... content truncated ...]"
         )
     return combined
 
 
-def ask_model(question: str, model: str, context: str) -> str:
-    """Send a question to the selected Ollama model and return the answer.
+def context_for_model(model: str) -> tuple[str, str]:
+    """Return ``(context, sha256)`` for the loaded dataset and ``model``.
+
+    The context is built once per token budget and kept in session state
+    until the files are processed again. For models whose window is smaller
+    than the usual reply and prompt reserves, the reserves are cut to half
+    the window and a warning is shown.
+    """
+    num_ctx = num_ctx_for_model(model)
+    reserves = REPLY_RESERVE_TOKENS + PROMPT_OVERHEAD_TOKENS
+    if num_ctx < reserves:
+        st.warning(
+            f"Model '{model}' has a context window of only {num_ctx} "
+            "tokens; most of the document content will be left out."
+        )
+        reserves = num_ctx // 2
+    budget = max(num_ctx - reserves, 0)
+    contexts = st.session_state.contexts
+    if budget not in contexts:
+        context = build_context(st.session_state.df, budget)
+        contexts[budget] = (
+            context,
+            hashlib.sha256(context.encode("utf-8")).hexdigest(),
+        )
+    return contexts[budget]
+
+
+class _AnswerCache:
+    """Thread-safe LRU mapping ``(model, context_hash, question)`` to answers.
+
+    Shared by all sessions of the process (see :func:`_answer_cache`).
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self._maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, str, str], str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[str, str, str]) -> Optional[str]:
+        with self._lock:
+            answer = self._entries.get(key)
+            if answer is not None:
+                self._entries.move_to_end(key)
+            return answer
+
+    def put(self, key: tuple[str, str, str], answer: str) -> None:
+        with self._lock:
+            self._entries[key] = answer
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+
+@st.cache_resource
+def _answer_cache() -> _AnswerCache:
+    """Return the process-wide answer cache, kept across script reruns."""
+    return _AnswerCache(ANSWER_CACHE_SIZE)
+
+
+def ask_model(
+    question: str, model: str, context: str, context_hash: str = ""
+) -> Iterator[str]:
+    """Send a question to the selected Ollama model and stream the answer.
+
+    Identical questions (ignoring case and surrounding whitespace) against
+    the same model and context are answered from an in-memory cache; a
+    completed streamed answer is added to that cache.
 
     Parameters
     ----------
@@ -205,12 +519,32 @@ def ask_model(question: str, model: str, context: str) -> str:
         The Ollama model identifier (e.g. ``"phi3:mini"``).
     context:
         Pre-built document context string.
+    context_hash:
+        SHA-256 hex digest of ``context``; computed here if not supplied.
 
-    Returns
-    -------
+    Yields
+    ------
     str
-        The model's response, or an error message string.
+        Chunks of the model's response, or an error message string.
     """
+    if not context_hash:
+        context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+    key = (model, context_hash, question.strip().lower())
+    stats = st.session_state.answer_cache
+
+    cached = _answer_cache().get(key)
+    if cached is not None:
+        stats["hits"] += 1
+        stats["last"] = "hit"
+        yield cached
+        return
+
+    stats["misses"] += 1
+    stats["last"] = "miss"
+    # Keep the system prompt and document context first and unchanged so
+    # Ollama can reuse the KV cache for that prefix; only the question
+    # varies. Any per-question variation should come from sampling options
+    # (e.g. temperature), never from reordering or editing these messages.
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {
@@ -222,13 +556,27 @@ def ask_model(question: str, model: str, context: str) -> str:
         },
         {"role": "user", "content": question},
     ]
+    parts: list[str] = []
     try:
-        response = ollama.chat(model=model, messages=messages)
-        return response.message.content.strip()
+        stream = _ollama_client().chat(
+            model=model,
+            messages=messages,
+            options={"num_ctx": num_ctx_for_model(model)},
+            keep_alive=OLLAMA_KEEP_ALIVE,
+            stream=True,
+        )
+        for chunk in stream:
+            content = chunk.message.content or ""
+            parts.append(content)
+            yield content
     except Exception as exc:  # noqa: BLE001
         st.error(f"Error while querying model '{model}': {exc}")
         traceback.print_exc()
-        return f"An error occurred: {exc}"
+        yield f"An error occurred: {exc}"
+        return
+    # Store exactly what was streamed so a cache hit replays the same text;
+    # the caller normalises it once for the history
+    _answer_cache().put(key, "".join(parts))
 
 
 # ---------------------------------------------------------------------------
@@ -240,6 +588,8 @@ with st.sidebar:
     st.markdown("---")
 
     # Model selector
+    if st.button("Refresh models", width="stretch"):
+        get_model_list.clear()
     available_models = get_model_list()
     if available_models:
         selected_model: str = st.selectbox(
@@ -308,28 +658,62 @@ if process_clicked:
     if not uploaded_files:
         st.error("Please upload at least one file before processing.")
     else:
-        records: list[dict] = []
         progress_bar = st.progress(0, text="Processing files...")
 
-        for idx, uf in enumerate(uploaded_files):
-            progress_bar.progress(
-                (idx + 1) / len(uploaded_files),
-                text=f"Processing {uf.name}...",
-            )
-            text = extract_text_from_file(uf)
-            if text:
-                records.append({"name": uf.name, "content": text})
+        # Extract files on a thread pool. Workers never touch Streamlit;
+        # their results and errors are collected here and reported
+        # afterwards. PDFium parsing is serialised by _pdfium_lock and the
+        # pure-Python parsers hold the GIL, so the pool mainly overlaps
+        # file reads, the extraction cache and the PyPDF2 fallback rather
+        # than giving a per-file speedup.
+        texts: dict[int, str] = {}
+        warnings: list[str] = []
+        errors: list[str] = []
+        workers = min(MAX_EXTRACT_WORKERS, len(uploaded_files))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(extract_text_cached, uf): idx
+                for idx, uf in enumerate(uploaded_files)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                idx = futures[future]
+                name = uploaded_files[idx].name
+                progress_bar.progress(
+                    done / len(uploaded_files),
+                    text=f"Processed {name}...",
+                )
+                try:
+                    texts[idx] = future.result()
+                except UnsupportedFileTypeError as exc:
+                    warnings.append(str(exc))
+                except Exception as exc:  # noqa: BLE001
+                    errors.append(f"Could not process '{name}': {exc}")
 
         progress_bar.empty()
+        for message in warnings:
+            st.warning(message)
+        for message in errors:
+            st.error(message)
+
+        # Keep records in upload order regardless of completion order
+        records: list[dict] = [
+            {"name": uf.name, "content": texts[idx]}
+            for idx, uf in enumerate(uploaded_files)
+            if texts.get(idx)
+        ]
 
         if records:
             st.session_state.df = pd.DataFrame(records)
-            st.session_state.df.to_csv(DATASET_FILE, index=False)
+            st.session_state.total_chars = sum(
+                len(record["content"]) for record in records
+            )
+            # Contexts are built lazily per token budget; drop stale ones
+            st.session_state.contexts = {}
+            st.session_state.dataset_csv = None
             st.session_state.show_data = True
             st.success(
-                f" {len(records)} file(s) processed and saved to temporary storage."
+                f" {len(records)} file(s) processed."
             )
-            st.rerun()
         else:
             st.error(
                 "No valid content could be extracted from the uploaded files."
@@ -341,20 +725,43 @@ if process_clicked:
 
 if st.session_state.show_data and not st.session_state.df.empty:
     with st.expander("Processed Document Preview", expanded=False):
-        preview_df = st.session_state.df.copy()
-        preview_df["content"] = preview_df["content"].str[:300] + "..."
+        # Build the preview directly instead of copying the full content
+        preview_df = pd.DataFrame(
+            {
+                "name": st.session_state.df["name"],
+                "content": [
+                    text[:300] + "..."
+                    for text in st.session_state.df["content"].to_numpy()
+                ],
+            }
+        )
         # FIXED: replaced use_container_width with width
         st.dataframe(preview_df, width="stretch")
 
         col_a, col_b = st.columns(2)
         col_a.metric("Documents loaded", len(st.session_state.df))
-        total_chars = int(st.session_state.df["content"].str.len().sum())
-        col_b.metric("Total characters", f"{total_chars:,}")
+        col_b.metric(
+            "Total characters", f"{st.session_state.total_chars:,}"
+        )
+
+        # Serialise only on request; the expander body runs on every rerun
+        if st.session_state.dataset_csv is None:
+            if st.button("Prepare CSV download"):
+                st.session_state.dataset_csv = dataset_csv(st.session_state.df)
+        if st.session_state.dataset_csv is not None:
+            st.download_button(
+                "Download as CSV",
+                data=st.session_state.dataset_csv,
+                file_name="dataset.csv",
+                mime="text/csv",
+            )
 
 # ---------------------------------------------------------------------------
 # Q&A section
 # ---------------------------------------------------------------------------
 
+answered_in_place = False
+
 if not st.session_state.df.empty:
     st.markdown("---")
     st.markdown("### Ask a Question")
@@ -376,30 +783,53 @@ if not st.session_state.df.empty:
                 "No model selected. Please install an Ollama model first."
             )
         else:
-            with st.spinner(f"Thinking with **{selected_model}**..."):
-                context = build_context(st.session_state.df)
-                answer = ask_model(user_question.strip(), selected_model, context)
-            st.session_state.chat.append((user_question.strip(), answer))
-            st.rerun()
+            # Render the new exchange in place and stream the answer into it
+            question = user_question.strip()
+            context, context_hash = context_for_model(selected_model)
+            with st.chat_message("user"):
+                st.write(question)
+            with st.chat_message("assistant"):
+                answer = st.write_stream(
+                    ask_model(
+                        question,
+                        selected_model,
+                        context,
+                        context_hash,
+                    )
+                )
+            st.session_state.chat.append((question, answer.strip()))
+            answered_in_place = True
+
+    with st.expander("Debug: answer cache", expanded=False):
+        stats = st.session_state.answer_cache
+        col_hits, col_misses, col_last = st.columns(3)
+        col_hits.metric("Hits", stats["hits"])
+        col_misses.metric("Misses", stats["misses"])
+        col_last.metric("Last lookup", stats["last"] or "—")
 
 # ---------------------------------------------------------------------------
 # Chat history
 # ---------------------------------------------------------------------------
 
-if st.session_state.chat:
+# Only show the section if something is left after skipping an exchange
+# already rendered in place above during this run
+if len(st.session_state.chat) > int(answered_in_place):
     st.markdown("---")
     st.markdown("### Conversation History")
 
     # Display newest messages first
-    for user_msg, assistant_msg in reversed(st.session_state.chat):
+    history = reversed(st.session_state.chat)
+    if answered_in_place:
+        next(history)
+    for user_msg, assistant_msg in history:
         with st.chat_message("user"):
             st.write(user_msg)
         with st.chat_message("assistant"):
             st.write(assistant_msg)
 
-    if st.button("Clear conversation"):
-        st.session_state.chat = []
-        st.rerun()
+    # Clearing in a callback runs before the next script run, so no extra
+    # st.rerun() is needed to hide the old messages
+    st.button("Clear conversation", on_click=st.session_state.chat.clear)
 
 elif st.session_state.df.empty:
     # Onboarding hint shown when no documents are loaded yet
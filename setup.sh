@@ -34,6 +34,13 @@ info "Installing Python dependencies from requirements.txt…"
 pip install --quiet --upgrade pip
 pip install --quiet -r requirements.txt
 
+# tiktoken downloads its encoding on first use; fetch it now so the app can
+# count tokens offline (app.py points TIKTOKEN_CACHE_DIR at the same place).
+info "Caching the tiktoken encoding for offline use…"
+TIKTOKEN_CACHE_DIR="$PWD/.tiktoken_cache" \
+    python -c "import tiktoken; tiktoken.get_encoding('cl100k_base')" \
+    || warning "Could not cache the tiktoken encoding — token counts will be estimated."
+
 deactivate
 
 # ── 4. Ollama ─────────────────────────────────────────────────────────────────